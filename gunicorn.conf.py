@@ -0,0 +1,13 @@
+import os
+
+# Serve the Flask app with threaded workers so slow uploads and downloads
+# don't pin a whole worker process. Redacted documents and cached analyses
+# live in the worker's memory, so a download must reach the worker that
+# handled its /apply: run one worker and scale with threads until that
+# state moves to a shared store (e.g. Redis).
+wsgi_app = "src.main:app"
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+worker_class = "gthread"
+workers = int(os.environ.get("GUNICORN_WORKERS", 1))
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+timeout = 120
@@ -3,12 +3,29 @@ import sys
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
+import orjson
 from flask import Flask, send_from_directory
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from src.routes.documents import documents_bp
 from src.routes.redaction import redaction_bp
 
+class ORJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson, keeping Flask's sorting and fallbacks"""
+
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_NON_STR_KEYS
+        if kwargs.get("sort_keys", self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get("indent"):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=kwargs.get("default", self.default), option=option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+app.json = ORJSONProvider(app)
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
 
 # Enable CORS for all routes
@@ -0,0 +1,48 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# One pool per server process, shared by PDF extraction and large-text scans,
+# and capped so several server processes don't start a pool per core each
+MAX_POOL_WORKERS = min(os.cpu_count() or 1, 4)
+
+# Workers start from a clean server process rather than a fork of this
+# multi-threaded one, which could copy a lock another thread holds
+_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    """Return the shared process pool, creating it on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=MAX_POOL_WORKERS,
+                mp_context=multiprocessing.get_context(_START_METHOD)
+            )
+    return _executor
+
+def pool_map(fn, *iterables):
+    """Map fn over iterables in the shared pool and return the results as a list.
+
+    If a worker dies (e.g. a native crash), the pool is broken for good, so it
+    is dropped for the next call to replace and BrokenProcessPool is re-raised.
+    """
+    executor = get_executor()
+    try:
+        return list(executor.map(fn, *iterables))
+    except BrokenProcessPool:
+        _discard_executor(executor)
+        raise
+
+def _discard_executor(executor):
+    """Forget a broken pool so get_executor creates a fresh one"""
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
@@ -1,45 +1,129 @@
 import os
+import re
 import uuid
 from flask import Blueprint, request, jsonify
+from werkzeug.exceptions import RequestEntityTooLarge
 import PyPDF2
 import io
-from src.simple_pii_detector import SimplePIIDetector
+import threading
+from itertools import repeat
+from src.process_pool import MAX_POOL_WORKERS, pool_map
+from src.routes.redaction import EMPTY_PII_ANALYSIS, get_pii_analysis
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:  # PDFium is optional; PyPDF2 remains the fallback extractor
+    pdfium = None
 
 documents_bp = Blueprint("documents", __name__)
 
 # Configuration
 ALLOWED_EXTENSIONS = {"pdf", "txt"}
+_EXTENSION_RE = re.compile(r"\.(%s)\Z" % "|".join(sorted(ALLOWED_EXTENSIONS)), re.IGNORECASE)
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
+MAX_REQUEST_SIZE = MAX_FILE_SIZE + 64 * 1024  # Headroom for multipart framing
+PARALLEL_PDF_MIN_PAGES = 32  # Smaller PDFs aren't worth the process round-trip
+
+# PDFium is not thread-safe; serialize its use within a process
+_pdfium_lock = threading.Lock()
+
+def _count_pdf_pages(pdf_bytes, use_pdfium=True):
+    """Return the number of pages in a PDF"""
+    if use_pdfium and pdfium is not None:
+        with _pdfium_lock:
+            pdf = pdfium.PdfDocument(pdf_bytes)
+            try:
+                return len(pdf)
+            finally:
+                pdf.close()
+    return len(PyPDF2.PdfReader(io.BytesIO(pdf_bytes)).pages)
+
+def _extract_pages_pdfium(pdf_bytes, start, end):
+    """Extract text from pages [start, end) using PDFium's native text extractor"""
+    chunks = []
+    with _pdfium_lock:
+        pdf = pdfium.PdfDocument(pdf_bytes)
+        try:
+            for index in range(start, end):
+                page = pdf[index]
+                textpage = page.get_textpage()
+                try:
+                    page_text = textpage.get_text_range()
+                finally:
+                    textpage.close()
+                    page.close()
+                if page_text:
+                    # PDFium breaks lines with \r\n; match PyPDF2's \n so patterns
+                    # allowing a single separator (phone numbers) still match
+                    chunks.append(page_text.replace("\r\n", "\n"))
+        finally:
+            pdf.close()
+    return chunks
+
+def _extract_pages_pypdf2(pdf_bytes, start, end):
+    """Extract text from pages [start, end) using PyPDF2"""
+    chunks = []
+    pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
+    for index in range(start, end):
+        page_text = pdf_reader.pages[index].extract_text()
+        if page_text:
+            chunks.append(page_text)
+    return chunks
+
+def _extract_page_range(pdf_bytes, start, end, use_pdfium=True):
+    """Extract non-empty page texts from pages [start, end); picklable for worker processes"""
+    if use_pdfium and pdfium is not None:
+        return _extract_pages_pdfium(pdf_bytes, start, end)
+    return _extract_pages_pypdf2(pdf_bytes, start, end)
 
-# Initialize PII detector
-pii_detector = SimplePIIDetector()
+def _extract_pages_parallel(pdf_bytes, page_count, use_pdfium=True):
+    """Split the page range across the process pool and return page texts in order"""
+    step = -(-page_count // MAX_POOL_WORKERS)
+    starts = range(0, page_count, step)
+    ends = [min(start + step, page_count) for start in starts]
+    chunks = []
+    for part in pool_map(_extract_page_range, repeat(pdf_bytes), starts, ends, repeat(use_pdfium)):
+        chunks.extend(part)
+    return chunks
 
-def allowed_file(filename):
-    return "." in filename and \
-           filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
+def _extract_all_pages(pdf_bytes, use_pdfium=True):
+    """Return the non-empty page texts of a PDF, in page order"""
+    page_count = _count_pdf_pages(pdf_bytes, use_pdfium)
+    if page_count >= PARALLEL_PDF_MIN_PAGES and MAX_POOL_WORKERS > 1:
+        return _extract_pages_parallel(pdf_bytes, page_count, use_pdfium)
+    return _extract_page_range(pdf_bytes, 0, page_count, use_pdfium)
 
 def extract_text_from_pdf_in_memory(file_stream):
-    """Extract text from PDF file stream using PyPDF2"""
-    text = ""
+    """Extract text from PDF file stream using PDFium, or PyPDF2 if unavailable or PDFium fails"""
     try:
-        pdf_reader = PyPDF2.PdfReader(file_stream)
-        for page in pdf_reader.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text + "\n"
+        pdf_bytes = file_stream.read()
+        if pdfium is not None:
+            try:
+                chunks = _extract_all_pages(pdf_bytes)
+            except pdfium.PdfiumError as e:
+                print(f"PDFium extraction failed, retrying with PyPDF2: {e}")
+                chunks = _extract_all_pages(pdf_bytes, use_pdfium=False)
+        else:
+            chunks = _extract_all_pages(pdf_bytes, use_pdfium=False)
     except Exception as e:
         print(f"PDF extraction failed: {e}")
         return None
-    return text.strip() if text.strip() else None
+    text = "\n".join(chunks).strip()
+    return text or None
 
 def extract_text_from_txt_in_memory(file_stream):
     """Extract text from TXT file stream"""
     try:
-        text = file_stream.read().decode("utf-8")
+        data = file_stream.read()
+    except Exception as e:
+        print(f"TXT extraction failed: {e}")
+        return None
+    try:
+        text = data.decode("utf-8")
         return text.strip() if text.strip() else None
     except UnicodeDecodeError:
         try:
-            text = file_stream.read().decode("latin-1")
+            text = data.decode("latin-1")
             return text.strip() if text.strip() else None
         except Exception as e:
             print(f"TXT extraction failed: {e}")
@@ -52,6 +136,14 @@ def extract_text_from_txt_in_memory(file_stream):
 def upload_file():
     """Handle file upload and text extraction in-memory"""
     try:
+        # Reject oversized uploads from the header before the body is parsed
+        if request.content_length is not None and request.content_length > MAX_REQUEST_SIZE:
+            return jsonify({"error": "File size exceeds 50MB limit"}), 413
+        
+        # Let Werkzeug stop reading a body without a usable length at the limit;
+        # set here so the redaction routes can take texts this route returns
+        request.max_content_length = MAX_REQUEST_SIZE
+        
         if "file" not in request.files:
             return jsonify({"error": "No file provided"}), 400
         
@@ -60,7 +152,8 @@ def upload_file():
         if file.filename == "":
             return jsonify({"error": "No file selected"}), 400
         
-        if not allowed_file(file.filename):
+        extension_match = _EXTENSION_RE.search(file.filename)
+        if extension_match is None:
             return jsonify({"error": "File type not supported"}), 400
         
         file.seek(0, os.SEEK_END)
@@ -68,30 +161,24 @@ def upload_file():
         file.seek(0)
         
         if file_size > MAX_FILE_SIZE:
-            return jsonify({"error": "File size exceeds 50MB limit"}), 400
-        
-        file_extension = file.filename.rsplit(".", 1)[1].lower()
+            return jsonify({"error": "File size exceeds 50MB limit"}), 413
         
-        # Read file content into memory
-        file_stream = io.BytesIO(file.read())
+        file_extension = extension_match.group(1).lower()
         
+        # Extractors read the uploaded stream directly; no intermediate copy
         extracted_text = None
         if file_extension == "pdf":
-            extracted_text = extract_text_from_pdf_in_memory(file_stream)
+            extracted_text = extract_text_from_pdf_in_memory(file.stream)
         elif file_extension == "txt":
-            extracted_text = extract_text_from_txt_in_memory(file_stream)
+            extracted_text = extract_text_from_txt_in_memory(file.stream)
         
         pii_analysis = None
         if extracted_text:
             try:
-                pii_analysis = pii_detector.generate_redaction_suggestions(extracted_text)
+                pii_analysis = get_pii_analysis(extracted_text)
             except Exception as e:
                 print(f"PII detection error: {e}")
-                pii_analysis = {
-                    "detections": [],
-                    "summary": {"total_detections": 0, "by_type": {}, "high_confidence": 0, "medium_confidence": 0, "low_confidence": 0},
-                    "suggestions": ["PII detection temporarily unavailable"]
-                }
+                pii_analysis = {**EMPTY_PII_ANALYSIS, "suggestions": ["PII detection temporarily unavailable"]}
         
         response_data = {
             "success": True,
@@ -107,6 +194,8 @@ def upload_file():
         
         return jsonify(response_data), 200
         
+    except RequestEntityTooLarge:
+        return jsonify({"error": "File size exceeds 50MB limit"}), 413
     except Exception as e:
         print(f"Upload error: {e}")
         return jsonify({"error": "Internal server error during file processing"}), 500
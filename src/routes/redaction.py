@@ -1,34 +1,120 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, request, jsonify, send_file, make_response
 from src.simple_pii_detector import SimplePIIDetector
 from src.simple_redaction_engine import SimpleRedactionEngine
+import hashlib
 import io
+import threading
+from concurrent.futures import Future
+from functools import lru_cache
 import datetime
+from dataclasses import dataclass
+from cachetools import TTLCache
+import orjson
 
 redaction_bp = Blueprint("redaction", __name__)
 
+@dataclass(slots=True)
+class AuditTrail:
+    """Record of a single /apply call, kept alongside the redacted document"""
+    timestamp: str
+    original_filename: str
+    redaction_options: dict
+    selected_detections: list
+    redacted_length: int
+    original_length: int
+
 # Initialize PII detector and Redaction Engine
 pii_detector = SimplePIIDetector()
 redaction_engine = SimpleRedactionEngine()
 
+# The shortest pattern the detector knows (a 5-digit ZIP) can't match anything shorter
+MIN_PII_TEXT_LENGTH = 5
+
+# Longest text whose analysis is kept in the cache
+MAX_CACHED_ANALYSIS_LENGTH = 256 * 1024
+
+# Same shape as _compute_pii_analysis returns for text with no detections
+EMPTY_PII_ANALYSIS = {
+    "detections": [],
+    "summary": {"total_detections": 0, "by_type": {}, "high_confidence": 0, "medium_confidence": 0, "low_confidence": 0},
+    "risk_level": "low",
+    "priority_items": [],
+    "suggestions": ["No sensitive information detected."]
+}
+
+# Analyses currently being computed, keyed by text, so concurrent
+# requests for the same text wait on one detector pass
+_inflight_analyses = {}
+_inflight_lock = threading.Lock()
+
+def _compute_pii_analysis(text):
+    """Detect PII in text and combine the detections with redaction suggestions"""
+    result = pii_detector.detect_pii(text)
+    detections = result["detections"]
+    suggestions = pii_detector.get_redaction_suggestions(detections)
+    return {
+        "detections": detections,
+        "summary": result["summary"],
+        "risk_level": suggestions["risk_level"],
+        "priority_items": suggestions["priority_items"],
+        "suggestions": suggestions["suggestions"]
+    }
+
+@lru_cache(maxsize=256)
+def _cached_pii_analysis(text):
+    """Return PII analysis for text, reusing results for recently seen inputs"""
+    return _compute_pii_analysis(text)
+
+def get_pii_analysis(text):
+    """Return PII analysis for text, coalescing concurrent requests for the same text"""
+    if len(text) < MIN_PII_TEXT_LENGTH:
+        return EMPTY_PII_ANALYSIS
+    with _inflight_lock:
+        future = _inflight_analyses.get(text)
+        owner = future is None
+        if owner:
+            future = Future()
+            _inflight_analyses[text] = future
+    if not owner:
+        # Wait as long as the owner takes; giving up would only fail a request
+        # the detector is about to answer
+        return future.result()
+    # Only small texts are cached; a few large uploads would otherwise pin
+    # hundreds of megabytes of text and detections in every worker
+    analyze = _cached_pii_analysis if len(text) <= MAX_CACHED_ANALYSIS_LENGTH else _compute_pii_analysis
+    try:
+        future.set_result(analyze(text))
+    except Exception as e:
+        future.set_exception(e)
+    finally:
+        with _inflight_lock:
+            del _inflight_analyses[text]
+    return future.result()
+
 # In-memory store for processed documents (temporary for session)
 # In a real production app, this would be a database or persistent storage
-processed_documents = {}
+# Bounded and expiring so a long-running server doesn't grow without limit;
+# TTLCache isn't thread-safe, so every access goes through the lock
+processed_documents = TTLCache(maxsize=1024, ttl=3600)
+processed_documents_lock = threading.Lock()
 
 @redaction_bp.route("/analyze", methods=["POST"])
 def analyze_text():
     """Analyze text for PII without file upload"""
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True)
         
-        if not data or "text" not in data:
+        if not isinstance(data, dict) or "text" not in data:
             return jsonify({"error": "Text is required"}), 400
         
         text = data["text"]
+        if not isinstance(text, str):
+            return jsonify({"error": "Text must be a string"}), 400
         if not text.strip():
             return jsonify({"error": "Text cannot be empty"}), 400
         
         # Perform PII analysis
-        pii_analysis = pii_detector.generate_redaction_suggestions(text)
+        pii_analysis = get_pii_analysis(text)
         
         return jsonify({
             "success": True,
@@ -43,28 +129,35 @@ def analyze_text():
 def preview_redaction():
     """Preview text with selected redactions applied"""
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True)
         
-        if not data or "text" not in data or "selected_detections" not in data:
+        if not isinstance(data, dict) or "text" not in data or "selected_detections" not in data:
             return jsonify({"error": "Text and selected_detections are required"}), 400
         
         text = data["text"]
         selected_detections = data["selected_detections"]
         redaction_options = data.get("redaction_options", {})
         
+        if not isinstance(text, str):
+            return jsonify({"error": "Text must be a string"}), 400
+        if not isinstance(selected_detections, list) or not all(isinstance(d, dict) for d in selected_detections):
+            return jsonify({"error": "selected_detections must be a list of objects"}), 400
+        if not isinstance(redaction_options, dict):
+            return jsonify({"error": "redaction_options must be an object"}), 400
+        
         if not text.strip():
             return jsonify({"error": "Text cannot be empty"}), 400
         
         # Apply redactions based on selected detections and options
-        redacted_text = redaction_engine.apply_redactions(
+        result = redaction_engine.apply_redactions(
             text, selected_detections, redaction_options
         )
         
         return jsonify({
             "success": True,
             "original_text": text,
-            "redacted_text": redacted_text,
-            "redactions_applied": len(selected_detections)
+            "redacted_text": result["redacted_text"],
+            "redactions_applied": result["summary"]["total_redactions"]
         }), 200
         
     except Exception as e:
@@ -75,9 +168,9 @@ def preview_redaction():
 def apply_redaction():
     """Apply permanent redactions and make document available for download"""
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True)
         
-        if not data or "file_id" not in data or "original_text" not in data or "selected_detections" not in data:
+        if not isinstance(data, dict) or "file_id" not in data or "original_text" not in data or "selected_detections" not in data:
             return jsonify({"error": "file_id, original_text, and selected_detections are required"}), 400
         
         file_id = data["file_id"]
@@ -86,29 +179,49 @@ def apply_redaction():
         redaction_options = data.get("redaction_options", {})
         original_filename = data.get("original_filename", "document.txt")
 
+        if not isinstance(file_id, str) or not isinstance(original_filename, str):
+            return jsonify({"error": "file_id and original_filename must be strings"}), 400
+        if not isinstance(original_text, str):
+            return jsonify({"error": "Original text must be a string"}), 400
+        if not isinstance(selected_detections, list) or not all(isinstance(d, dict) for d in selected_detections):
+            return jsonify({"error": "selected_detections must be a list of objects"}), 400
+        if not isinstance(redaction_options, dict):
+            return jsonify({"error": "redaction_options must be an object"}), 400
+
         if not original_text.strip():
             return jsonify({"error": "Original text cannot be empty"}), 400
 
-        redacted_text = redaction_engine.apply_redactions(
-            original_text, selected_detections, redaction_options
+        # One clock read shared by the engine's audit trail and the stored one
+        now = datetime.datetime.now()
+        result = redaction_engine.apply_redactions(
+            original_text, selected_detections, redaction_options, timestamp=now
         )
+        redacted_text = result["redacted_text"]
 
         # Generate audit trail
-        audit_trail = {
-            "timestamp": datetime.datetime.now().isoformat(),
-            "original_filename": original_filename,
-            "redaction_options": redaction_options,
-            "selected_detections": selected_detections,
-            "redacted_length": len(redacted_text),
-            "original_length": len(original_text)
-        }
+        audit_trail = AuditTrail(
+            timestamp=now.isoformat(),
+            original_filename=original_filename,
+            redaction_options=redaction_options,
+            selected_detections=selected_detections,
+            redacted_length=len(redacted_text),
+            original_length=len(original_text)
+        )
+
+        # Encode once here so downloads serve the stored bytes as-is
+        redacted_bytes = redacted_text.encode("utf-8")
+
+        # Fingerprint the content so downloads can be answered with 304 Not Modified
+        etag = hashlib.blake2b(redacted_bytes, digest_size=16).hexdigest()
 
         # Store redacted content and audit trail in-memory for download
-        processed_documents[file_id] = {
-            "redacted_text": redacted_text,
-            "audit_trail": audit_trail,
-            "original_filename": original_filename
-        }
+        with processed_documents_lock:
+            processed_documents[file_id] = {
+                "redacted_bytes": redacted_bytes,
+                "etag": etag,
+                "audit_trail": audit_trail,
+                "original_filename": original_filename
+            }
 
         return jsonify({
             "success": True,
@@ -125,24 +238,30 @@ def apply_redaction():
 def download_redacted_document(file_id):
     """Download the redacted document"""
     try:
-        if file_id not in processed_documents:
+        with processed_documents_lock:
+            doc_data = processed_documents.get(file_id)
+        if doc_data is None:
             return jsonify({"error": "Redacted document not found or expired"}), 404
         
-        doc_data = processed_documents[file_id]
-        redacted_text = doc_data["redacted_text"]
-        original_filename = doc_data["original_filename"]
+        etag = doc_data["etag"]
 
-        # Create a file-like object in memory
-        output = io.BytesIO(redacted_text.encode("utf-8"))
-        output.seek(0)
+        # Client already holds this exact content; skip encoding and transfer
+        if request.if_none_match.contains(etag):
+            response = make_response("", 304)
+            response.set_etag(etag)
+            return response
+
+        original_filename = doc_data["original_filename"]
 
-        # Clean up the in-memory store after download (optional, but good for memory management)
-        # del processed_documents[file_id]
+        # BytesIO shares the stored buffer rather than copying it, and send_file
+        # streams it to the client block by block
+        output = io.BytesIO(doc_data["redacted_bytes"])
 
         return send_file(
             output,
             mimetype="text/plain",
             as_attachment=True,
+            etag=etag,
             download_name=f"redacted_{original_filename.replace(".txt", "").replace(".pdf", "")}_{datetime.datetime.now().strftime("%Y%m%d%H%M%S")}.txt"
         )
 
@@ -154,15 +273,16 @@ def download_redacted_document(file_id):
 def download_audit_trail(file_id):
     """Download the audit trail for a redacted document"""
     try:
-        if file_id not in processed_documents:
+        with processed_documents_lock:
+            doc_data = processed_documents.get(file_id)
+        if doc_data is None:
             return jsonify({"error": "Audit trail not found or expired"}), 404
         
-        doc_data = processed_documents[file_id]
         audit_trail = doc_data["audit_trail"]
         original_filename = doc_data["original_filename"]
 
-        # Create a file-like object in memory for the JSON audit trail
-        output = io.BytesIO(jsonify(audit_trail).data)
+        # Serialize straight to bytes; no Response object needed just for the body
+        output = io.BytesIO(orjson.dumps(audit_trail))
         output.seek(0)
 
         return send_file(
@@ -180,19 +300,21 @@ def download_audit_trail(file_id):
 def get_redaction_suggestions():
     """Get intelligent redaction suggestions based on document type and content"""
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True)
         
-        if not data or "text" not in data:
+        if not isinstance(data, dict) or "text" not in data:
             return jsonify({"error": "Text is required"}), 400
         
         text = data["text"]
         document_type = data.get("document_type", "general")
         
+        if not isinstance(text, str):
+            return jsonify({"error": "Text must be a string"}), 400
         if not text.strip():
             return jsonify({"error": "Text cannot be empty"}), 400
         
         # Get PII analysis
-        pii_analysis = pii_detector.generate_redaction_suggestions(text)
+        pii_analysis = get_pii_analysis(text)
         
         # Generate context-aware suggestions
         smart_suggestions = redaction_engine.generate_smart_suggestions(pii_analysis, document_type, text)
@@ -1,5 +1,30 @@
 import re
-from typing import List, Dict, Any
+import sys
+from collections import Counter
+from concurrent.futures.process import BrokenProcessPool
+from itertools import repeat
+from operator import itemgetter
+from typing import List, Dict, Any, Tuple, Union
+
+from src.process_pool import MAX_POOL_WORKERS, pool_map
+
+# Texts longer than this are scanned in chunks across the process pool; the
+# stdlib regex engine holds the GIL, so threads wouldn't run chunks in parallel
+PARALLEL_SCAN_MIN_LENGTH = 256 * 1024
+SCAN_CHUNK_SIZE = 64 * 1024
+# Lets matches starting near a chunk's end finish in its window. Every pattern
+# is capped so a match plus any lookahead past it spans fewer characters than
+# this (at most 831, for the email pattern); serial scans use the same caps
+SCAN_CHUNK_OVERLAP = 1024
+
+# Types that drive the risk assessment in get_redaction_suggestions
+HIGH_RISK_TYPES = frozenset({'ssn', 'credit_card'})
+MEDIUM_RISK_TYPES = frozenset({'email', 'phone', 'date_of_birth'})
+
+def _scan_window(pattern: re.Pattern, window: Union[str, bytes], pos: int, offset: int) -> List[Tuple[str, int, int]]:
+    """Return (type, start, end) for matches in window from pos, shifted by offset; picklable for worker processes"""
+    return [(match.lastgroup, match.start() + offset, match.end() + offset)
+            for match in pattern.finditer(window, pos)]
 
 class SimplePIIDetector:
     """
@@ -11,34 +36,98 @@ class SimplePIIDetector:
         # Define regex patterns for different PII types
         self.patterns = {
             'email': {
-                'pattern': r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b',
-                'confidence': 0.95
+                # Local part and domain capped at their RFC 5321 lengths, so a long
+                # run of dotted words costs a bounded scan per start, not the whole
+                # run. Longer local parts, up to 512, are still caught by the second
+                # branch, which may only start where the run does, so it scans each
+                # run once. The caps keep a match within SCAN_CHUNK_OVERLAP
+                'pattern': r'(?:\b[A-Za-z0-9._%+-]{1,64}|(?<![A-Za-z0-9._%+-])\b[A-Za-z0-9._%+-]{65,512})'
+                           r'@[A-Za-z0-9.-]{1,253}\.[A-Z|a-z]{2,63}\b',
+                'confidence': 0.95,
+                'flags': re.IGNORECASE,
+                'requires': '@'
             },
             'phone': {
                 'pattern': r'(?:\+?1[-.\s]?)?\(?([0-9]{3})\)?[-.\s]?([0-9]{3})[-.\s]?([0-9]{4})',
-                'confidence': 0.90
+                'confidence': 0.90,
+                'requires': 'digit'
             },
             'ssn': {
                 'pattern': r'\b\d{3}-\d{2}-\d{4}\b',
-                'confidence': 0.98
+                'confidence': 0.98,
+                'requires': 'digit'
             },
             'credit_card': {
                 'pattern': r'\b\d{4}[-\s]?\d{4}[-\s]?\d{4}[-\s]?\d{4}\b',
-                'confidence': 0.85
+                'confidence': 0.85,
+                'requires': 'digit'
             },
             'zip_code': {
                 'pattern': r'\b\d{5}(?:-\d{4})?\b',
-                'confidence': 0.70
+                'confidence': 0.70,
+                'requires': 'digit'
             },
             'date_of_birth': {
                 'pattern': r'\b(?:0[1-9]|1[0-2])[/-](?:0[1-9]|[12]\d|3[01])[/-](?:19|20)\d{2}\b',
-                'confidence': 0.60
+                'confidence': 0.60,
+                'requires': 'digit'
             },
             'name': {
-                'pattern': r'\b[A-Z][a-z]+ [A-Z][a-z]+(?:\s[A-Z][a-z]+)?\b',
+                # Must not run into an email's local part, or it would hide the email;
+                # the lookahead reaches as far as the longest local part the email
+                # pattern accepts. Words are capped to keep within SCAN_CHUNK_OVERLAP
+                # Case-sensitive on purpose: capitalised word pairs, not any two words
+                'pattern': r'\b[A-Z][a-z]{1,63} [A-Z][a-z]{1,63}(?:\s[A-Z][a-z]{1,63})?\b(?![\w.%+-]{0,512}@)',
                 'confidence': 0.50
             }
         }
+        
+        # Type names end up in every detection and are compared and hashed
+        # throughout; intern them so those checks hit the identity fast path
+        self.patterns = {sys.intern(pii_type): config for pii_type, config in self.patterns.items()}
+        
+        # Fuse every pattern into one alternation of named groups so the text is
+        # scanned once. Alternatives are tried in order at each position, so
+        # higher-confidence types come first and win ties at the same offset.
+        # Case folding is scoped to the patterns that set it ('flags'); the
+        # digit-only patterns don't pay for it.
+        ordered = sorted(self.patterns.items(), key=lambda item: -item[1]['confidence'])
+        self.combined = self._fuse(ordered)
+        
+        # Patterns marked 'requires' can't match text lacking a digit or an '@',
+        # so precompile variants without them, keyed by (has_digit, has_at)
+        self._digit = re.compile(r'\d')
+        self._variants = {
+            (has_digit, has_at): self._fuse([
+                (pii_type, config) for pii_type, config in ordered
+                if (has_digit or config.get('requires') != 'digit')
+                and (has_at or config.get('requires') != '@')
+            ])
+            for has_digit in (True, False) for has_at in (True, False)
+        }
+        # Bytes twins of the variants for pure-ASCII text, which is most input
+        self._ascii_variants = {
+            key: re.compile(variant.pattern.encode('ascii'))
+            for key, variant in self._variants.items()
+        }
+        self.confidences = {pii_type: config['confidence'] for pii_type, config in self.patterns.items()}
+        # Group names coming back from a match are the regex parser's own copies
+        # (or unpickled ones from the scan pool), so map them to the interned name
+        self._types = {pii_type: (pii_type, config['confidence']) for pii_type, config in self.patterns.items()}
+    
+    @classmethod
+    def _fuse(cls, ordered: List) -> re.Pattern:
+        """Compile (type, config) pairs into one alternation of named groups."""
+        return re.compile('|'.join(
+            f"(?P<{pii_type}>{cls._scoped(config)})" for pii_type, config in ordered
+        ))
+    
+    @staticmethod
+    def _scoped(config: Dict[str, Any]) -> str:
+        """Return a pattern wrapped so its flags apply only inside the fused regex."""
+        if config.get('flags', 0) & re.IGNORECASE:
+            return f"(?i:{config['pattern']})"
+        return config['pattern']
     
     def detect_pii(self, text: str) -> Dict[str, Any]:
         """
@@ -51,22 +140,39 @@ class SimplePIIDetector:
             Dict containing detections and summary
         """
         detections = []
+        append = detections.append
+        types = self._types
         
-        for pii_type, config in self.patterns.items():
-            pattern = config['pattern']
-            confidence = config['confidence']
-            
-            matches = re.finditer(pattern, text, re.IGNORECASE)
-            
-            for match in matches:
-                detection = {
-                    'text': match.group(),
-                    'type': pii_type,
-                    'confidence': confidence,
-                    'start': match.start(),
-                    'end': match.end()
-                }
-                detections.append(detection)
+        # Skip the digit-based patterns and email when the text can't contain them
+        key = (self._digit.search(text) is not None, '@' in text)
+        
+        # Scan pure-ASCII text as bytes: offsets are the same as in the str, and
+        # the bytes engine skips the Unicode character-class lookups
+        if text.isascii():
+            pattern, subject = self._ascii_variants[key], text.encode('ascii')
+        else:
+            pattern, subject = self._variants[key], text
+        
+        spans = None
+        if len(subject) > PARALLEL_SCAN_MIN_LENGTH and MAX_POOL_WORKERS > 1:
+            try:
+                spans = self._scan_parallel(pattern, subject)
+            except BrokenProcessPool:
+                # A pool worker died; the pool is replaced for the next
+                # call, and this text is scanned in-process instead
+                pass
+        if spans is None:
+            spans = [(match.lastgroup, *match.span()) for match in pattern.finditer(subject)]
+        
+        for group, start, end in spans:
+            pii_type, confidence = types[group]
+            append({
+                'text': text[start:end],
+                'type': pii_type,
+                'confidence': confidence,
+                'start': start,
+                'end': end
+            })
         
         # Remove overlapping detections (keep higher confidence)
         detections = self._remove_overlaps(detections)
@@ -79,6 +185,60 @@ class SimplePIIDetector:
             'summary': summary
         }
     
+    def _scan_parallel(self, pattern: re.Pattern, text: Union[str, bytes]) -> List[Tuple[str, int, int]]:
+        """
+        Scan text (str, or ASCII bytes) in overlapping chunks across the process pool.
+        
+        Each chunk owns the matches starting inside it. A chunk's window also
+        carries one character of left context (for word boundaries) and an
+        overlap past its end. No pattern reads further than SCAN_CHUNK_OVERLAP
+        past where its match starts, so matches starting inside the chunk come
+        out as in a full scan. Where a match runs into the next chunk, that
+        chunk's own scan may be out of step with a scan of the whole text; it is
+        rescanned from the end of the match until the two agree. The result
+        equals a single full scan.
+        """
+        length = len(text)
+        chunk_starts = range(0, length, SCAN_CHUNK_SIZE)
+        lows = [max(start - 1, 0) for start in chunk_starts]
+        windows = [text[low:start + SCAN_CHUNK_SIZE + SCAN_CHUNK_OVERLAP]
+                   for low, start in zip(lows, chunk_starts)]
+        positions = [start - low for low, start in zip(lows, chunk_starts)]
+        results = pool_map(_scan_window, repeat(pattern), windows, positions, lows)
+        
+        spans = []
+        end = 0  # End of the last match kept
+        for chunk_start, chunk_spans in zip(chunk_starts, results):
+            chunk_end = chunk_start + SCAN_CHUNK_SIZE
+            
+            # Drop matches the previous chunk's last match already covers
+            index = 0
+            while index < len(chunk_spans) and chunk_spans[index][1] < end:
+                index += 1
+            
+            if index and chunk_spans[index - 1][2] > end:
+                # This chunk's scan stepped over the point the full scan resumes
+                # from; rescan from there until a match lines up with the chunk's
+                index = len(chunk_spans)
+                remaining = {span: i for i, span in enumerate(chunk_spans)}
+                for match in pattern.finditer(text, end, min(chunk_end + SCAN_CHUNK_OVERLAP, length)):
+                    span = (match.lastgroup, *match.span())
+                    if span[1] >= chunk_end:
+                        break
+                    if span in remaining:
+                        index = remaining[span]
+                        break
+                    spans.append(span)
+                    end = span[2]
+            
+            for span in chunk_spans[index:]:
+                if span[1] >= chunk_end:
+                    break
+                spans.append(span)
+                end = span[2]
+        
+        return spans
+    
     def _remove_overlaps(self, detections: List[Dict]) -> List[Dict]:
         """Remove overlapping detections, keeping the one with higher confidence."""
         if not detections:
@@ -87,40 +247,40 @@ class SimplePIIDetector:
         # Sort by start position
         detections.sort(key=lambda x: x['start'])
         
+        # Sweep left to right; the output stays sorted and non-overlapping, so
+        # a new detection can only conflict with the detections at its tail
         filtered = []
         for detection in detections:
-            # Check if this detection overlaps with any in filtered list
-            overlaps = False
-            for existing in filtered:
-                if (detection['start'] < existing['end'] and 
-                    detection['end'] > existing['start']):
-                    # There's an overlap
-                    if detection['confidence'] > existing['confidence']:
-                        # Remove the existing one and add this one
-                        filtered.remove(existing)
-                        filtered.append(detection)
-                    overlaps = True
+            dominated = False
+            while filtered and filtered[-1]['end'] > detection['start']:
+                if detection['confidence'] > filtered[-1]['confidence']:
+                    filtered.pop()
+                else:
+                    dominated = True
                     break
             
-            if not overlaps:
+            if not dominated:
                 filtered.append(detection)
         
         return filtered
     
     def _generate_summary(self, detections: List[Dict]) -> Dict[str, Any]:
         """Generate summary statistics for detections."""
-        total_detections = len(detections)
-        high_confidence = len([d for d in detections if d['confidence'] >= 0.8])
-        
-        by_type = {}
+        high_confidence = 0
+        medium_confidence = 0
         for detection in detections:
-            pii_type = detection['type']
-            by_type[pii_type] = by_type.get(pii_type, 0) + 1
+            confidence = detection['confidence']
+            if confidence >= 0.8:
+                high_confidence += 1
+            elif confidence >= 0.5:
+                medium_confidence += 1
         
         return {
-            'total_detections': total_detections,
+            'total_detections': len(detections),
             'high_confidence': high_confidence,
-            'by_type': by_type
+            'medium_confidence': medium_confidence,
+            'low_confidence': len(detections) - high_confidence - medium_confidence,
+            'by_type': dict(Counter(map(itemgetter('type'), detections)))
         }
     
     def get_redaction_suggestions(self, detections: List[Dict]) -> Dict[str, Any]:
@@ -140,30 +300,35 @@ class SimplePIIDetector:
                 'suggestions': ['No sensitive information detected.']
             }
         
-        # Assess risk level
-        high_risk_types = {'ssn', 'credit_card'}
-        medium_risk_types = {'email', 'phone', 'date_of_birth'}
+        # Tally everything the assessment needs in a single pass
+        high_confidence_count = 0
+        has_high_risk = False
+        has_medium_risk = False
+        priority_items = []
+        for detection in detections:
+            pii_type = detection['type']
+            is_high_confidence = detection['confidence'] >= 0.8
+            is_high_risk = pii_type in HIGH_RISK_TYPES
+            if is_high_confidence:
+                high_confidence_count += 1
+            if is_high_risk:
+                has_high_risk = True
+            elif pii_type in MEDIUM_RISK_TYPES:
+                has_medium_risk = True
+            # Priority items (high confidence or high risk)
+            if is_high_confidence or is_high_risk:
+                priority_items.append(detection)
         
-        risk_level = 'low'
-        high_confidence_count = len([d for d in detections if d['confidence'] >= 0.8])
+        type_counts = Counter(map(itemgetter('type'), detections))
         
-        if any(d['type'] in high_risk_types for d in detections):
+        risk_level = 'low'
+        if has_high_risk:
             risk_level = 'high'
-        elif any(d['type'] in medium_risk_types for d in detections) or high_confidence_count >= 3:
+        elif has_medium_risk or high_confidence_count >= 3:
             risk_level = 'medium'
         
-        # Priority items (high confidence or high risk)
-        priority_items = [
-            d for d in detections 
-            if d['confidence'] >= 0.8 or d['type'] in high_risk_types
-        ]
-        
         # Generate suggestions
         suggestions = []
-        type_counts = {}
-        for detection in detections:
-            pii_type = detection['type']
-            type_counts[pii_type] = type_counts.get(pii_type, 0) + 1
         
         if 'ssn' in type_counts:
             suggestions.append(f"Consider redacting all {type_counts['ssn']} Social Security Numbers for privacy compliance.")
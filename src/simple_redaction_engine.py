@@ -1,7 +1,24 @@
 import json
 import os
+from collections import Counter
 from datetime import datetime
-from typing import List, Dict, Any
+from operator import itemgetter
+from typing import List, Dict, Any, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # Optional; falls back to the standard library encoder
+    orjson = None
+
+# Options applied when a caller omits some or all redaction settings
+DEFAULT_REDACTION_OPTIONS = {
+    'style': 'black_bars',
+    'preserve_length': True,
+    'confidence_threshold': 0.0
+}
+
+# Longest replacement kept in the per-engine cache; longer ones are rare
+MAX_CACHED_REPLACEMENT_LENGTH = 256
 
 class SimpleRedactionEngine:
     """
@@ -25,9 +42,14 @@ class SimpleRedactionEngine:
             'zip_code': '[ZIP_REDACTED]',
             'date_of_birth': '[DOB_REDACTED]'
         }
+        
+        # Length-preserving replacements keyed by (char, length), so repeated
+        # same-length items (SSNs, card numbers, phones) share one string
+        self._repl_cache: Dict[Tuple[str, int], str] = {}
     
     def apply_redactions(self, text: str, detections: List[Dict], 
-                        redaction_options: Dict = None) -> Dict[str, Any]:
+                        redaction_options: Dict = None,
+                        timestamp: Optional[datetime] = None) -> Dict[str, Any]:
         """
         Apply redactions to text based on selected detections.
         
@@ -35,57 +57,141 @@ class SimpleRedactionEngine:
             text (str): Original text
             detections (List[Dict]): List of PII detections to redact
             redaction_options (Dict): Redaction configuration options
+            timestamp (datetime): Audit trail time; callers redacting a batch
+                can share one. Defaults to now.
             
         Returns:
             Dict containing redacted text and metadata
         """
-        if not redaction_options:
-            redaction_options = {
-                'style': 'black_bars',
-                'preserve_length': True,
-                'confidence_threshold': 0.0
-            }
+        # Merge caller options over the defaults once per call
+        redaction_options = {**DEFAULT_REDACTION_OPTIONS, **(redaction_options or {})}
+        threshold = redaction_options['confidence_threshold']
+        style = redaction_options['style']
+        preserve_length = redaction_options['preserve_length']
         
-        # Filter detections based on confidence threshold
+        # Filter detections based on confidence threshold, reading each
+        # detection's position and confidence once, with their defaults
         filtered_detections = [
-            d for d in detections 
-            if d.get('confidence', 0) >= redaction_options.get('confidence_threshold', 0)
+            (d.get('start', 0), d.get('end', len(d['text'])), confidence, d)
+            for d in detections
+            if (confidence := d.get('confidence', 0)) >= threshold
         ]
         
-        # Sort detections by start position (reverse order for proper replacement)
-        filtered_detections.sort(key=lambda x: x.get('start', 0), reverse=True)
+        # Sort detections by start position so the text can be rebuilt in one pass
+        filtered_detections.sort(key=itemgetter(0))
+        
+        # Resolve the style once; per item only the type or the length varies
+        labels = self.type_labels if style == 'labels' else None
+        char = self.redaction_styles.get(style, '█') if labels is None and preserve_length else None
+        fixed = self._fixed_replacement(style) if labels is None and char is None else None
+        preserving_replacement = self._preserving_replacement
         
-        redacted_text = text
+        parts = []
+        pos = 0
         redacted_items = []
         
-        for detection in filtered_detections:
-            start = detection.get('start', 0)
-            end = detection.get('end', len(detection['text']))
+        for start, end, confidence, detection in filtered_detections:
+            # Skip detections already covered by an earlier one and clip those
+            # that overlap it, so each character is replaced at most once
+            if end <= pos:
+                continue
             original_text = detection['text']
+            if start < pos:
+                start = pos
+                original_text = text[start:end]
             pii_type = detection['type']
             
-            # Generate replacement text
-            replacement = self._generate_replacement(
-                original_text, pii_type, redaction_options
-            )
+            # Generate replacement text, as _generate_replacement would
+            if labels is not None:
+                replacement = labels.get(pii_type, '[REDACTED]')
+            elif char is not None:
+                replacement = preserving_replacement(char, len(original_text))
+            else:
+                replacement = fixed
             
-            # Apply redaction
-            redacted_text = redacted_text[:start] + replacement + redacted_text[end:]
+            # Keep the untouched text up to this detection, then the replacement
+            parts.append(text[pos:start])
+            parts.append(replacement)
+            pos = end
             
             redacted_items.append({
                 'original_text': original_text,
                 'type': pii_type,
-                'confidence': detection.get('confidence', 0),
+                'confidence': confidence,
                 'position': {'start': start, 'end': end},
                 'replacement': replacement
             })
         
+        parts.append(text[pos:])
+        redacted_text = ''.join(parts)
+        
+        return self._build_result(text, redacted_text, redacted_items, redaction_options, timestamp)
+    
+    def detect_and_redact(self, text: str, detector,
+                          redaction_options: Dict = None,
+                          timestamp: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        Detect and redact PII in a single regex pass.
+        
+        Uses the detector's fused pattern with re.sub, so the text is scanned
+        and rebuilt once instead of detected, sorted and then replaced. Fused
+        matches never overlap, so no overlap resolution is needed; when two
+        types could match at the same offset the higher-confidence one wins.
+        
+        Args:
+            text (str): Original text
+            detector (SimplePIIDetector): Detector providing the fused pattern
+            redaction_options (Dict): Redaction configuration options
+            timestamp (datetime): Audit trail time, as in apply_redactions
+            
+        Returns:
+            Dict containing redacted text and metadata, as apply_redactions
+        """
+        redaction_options = {**DEFAULT_REDACTION_OPTIONS, **(redaction_options or {})}
+        threshold = redaction_options['confidence_threshold']
+        style = redaction_options['style']
+        preserve_length = redaction_options['preserve_length']
+        confidences = detector.confidences
+        redacted_items = []
+        
+        def redact_match(match):
+            pii_type = match.lastgroup
+            original_text = match.group()
+            confidence = confidences[pii_type]
+            if confidence < threshold:
+                return original_text
+            
+            replacement = self._generate_replacement(
+                original_text, pii_type, style, preserve_length
+            )
+            redacted_items.append({
+                'original_text': original_text,
+                'type': pii_type,
+                'confidence': confidence,
+                'position': {'start': match.start(), 'end': match.end()},
+                'replacement': replacement
+            })
+            return replacement
+        
+        redacted_text = detector.combined.sub(redact_match, text)
+        
+        return self._build_result(text, redacted_text, redacted_items, redaction_options, timestamp)
+    
+    def _build_result(self, text: str, redacted_text: str, redacted_items: List[Dict],
+                      redaction_options: Dict, timestamp: Optional[datetime] = None) -> Dict[str, Any]:
+        """Assemble the redaction result returned by the public redaction methods."""
+        # Count once; the top-level summary and the audit trail share the dicts
+        by_type, by_confidence = self._count_all(redacted_items)
+        
         # Generate audit trail
         audit_trail = self._generate_audit_trail(
             original_text=text,
             redacted_text=redacted_text,
             redacted_items=redacted_items,
-            redaction_options=redaction_options
+            redaction_options=redaction_options,
+            by_type=by_type,
+            by_confidence=by_confidence,
+            timestamp=timestamp
         )
         
         return {
@@ -94,66 +200,72 @@ class SimpleRedactionEngine:
             'audit_trail': audit_trail,
             'summary': {
                 'total_redactions': len(redacted_items),
-                'by_type': self._count_by_type(redacted_items)
+                'by_type': by_type
             }
         }
     
-    def _generate_replacement(self, original_text: str, pii_type: str, 
-                            options: Dict) -> str:
+    def _generate_replacement(self, original_text: str, pii_type: str,
+                            style: str, preserve_length: bool) -> str:
         """Generate replacement text for redaction."""
-        style = options.get('style', 'black_bars')
-        preserve_length = options.get('preserve_length', True)
-        
         if style == 'labels':
             return self.type_labels.get(pii_type, '[REDACTED]')
         
         if preserve_length:
-            char = self.redaction_styles.get(style, '█')
-            return char * len(original_text)
+            return self._preserving_replacement(self.redaction_styles.get(style, '█'), len(original_text))
+        return self._fixed_replacement(style)
+    
+    def _preserving_replacement(self, char: str, length: int) -> str:
+        """Return char repeated length times, shared across same-length items."""
+        key = (char, length)
+        replacement = self._repl_cache.get(key)
+        if replacement is None:
+            replacement = char * length
+            if length <= MAX_CACHED_REPLACEMENT_LENGTH:
+                self._repl_cache[key] = replacement
+        return replacement
+    
+    def _fixed_replacement(self, style: str) -> str:
+        """Return the fixed-length placeholder used when length isn't preserved."""
+        if style == 'black_bars':
+            return '████████'
+        elif style == 'asterisks':
+            return '********'
         else:
-            if style == 'black_bars':
-                return '████████'
-            elif style == 'asterisks':
-                return '********'
-            else:
-                return '[REDACTED]'
+            return '[REDACTED]'
     
     def _generate_audit_trail(self, original_text: str, redacted_text: str,
-                            redacted_items: List[Dict], redaction_options: Dict) -> Dict:
+                            redacted_items: List[Dict], redaction_options: Dict,
+                            by_type: Dict[str, int], by_confidence: Dict[str, int],
+                            timestamp: Optional[datetime] = None) -> Dict:
         """Generate audit trail for the redaction process."""
+        if timestamp is None:
+            timestamp = datetime.now()
         return {
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': timestamp.isoformat(),
             'redaction_options': redaction_options,
             'original_length': len(original_text),
             'redacted_length': len(redacted_text),
             'redacted_items': redacted_items,
             'summary': {
                 'total_redactions': len(redacted_items),
-                'by_type': self._count_by_type(redacted_items),
-                'by_confidence': self._count_by_confidence(redacted_items)
+                'by_type': by_type,
+                'by_confidence': by_confidence
             }
         }
     
-    def _count_by_type(self, redacted_items: List[Dict]) -> Dict[str, int]:
-        """Count redacted items by type."""
-        counts = {}
-        for item in redacted_items:
-            pii_type = item['type']
-            counts[pii_type] = counts.get(pii_type, 0) + 1
-        return counts
-    
-    def _count_by_confidence(self, redacted_items: List[Dict]) -> Dict[str, int]:
-        """Count redacted items by confidence level."""
-        counts = {'high': 0, 'medium': 0, 'low': 0}
+    def _count_all(self, redacted_items: List[Dict]) -> Tuple[Dict[str, int], Dict[str, int]]:
+        """Count redacted items by type and by confidence level."""
+        by_type = dict(Counter(map(itemgetter('type'), redacted_items)))
+        by_confidence = {'high': 0, 'medium': 0, 'low': 0}
         for item in redacted_items:
             confidence = item.get('confidence', 0)
             if confidence >= 0.8:
-                counts['high'] += 1
+                by_confidence['high'] += 1
             elif confidence >= 0.5:
-                counts['medium'] += 1
+                by_confidence['medium'] += 1
             else:
-                counts['low'] += 1
-        return counts
+                by_confidence['low'] += 1
+        return by_type, by_confidence
     
     def save_redacted_document(self, redacted_text: str, original_filename: str,
                              output_dir: str, file_format: str = 'txt') -> str:
@@ -169,33 +281,28 @@ class SimpleRedactionEngine:
         Returns:
             str: Path to saved file
         """
-        # Generate output filename
+        # Generate output filename; filename and header share one timestamp.
+        # Output is always plain text for now, even if PDF is requested
+        # (avoiding external dependencies), so the extension is fixed up front.
+        now = datetime.now()
         base_name = os.path.splitext(original_filename)[0]
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        output_filename = f"{base_name}_redacted_{timestamp}.{file_format}"
+        timestamp = now.strftime('%Y%m%d_%H%M%S')
+        output_filename = f"{base_name}_redacted_{timestamp}.txt"
         output_path = os.path.join(output_dir, output_filename)
         
         # Ensure output directory exists
         os.makedirs(output_dir, exist_ok=True)
         
-        if file_format.lower() == 'txt':
-            # Save as text file
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(f"REDACTED DOCUMENT\n")
-                f.write(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write(f"Original: {original_filename}\n")
-                f.write("-" * 50 + "\n\n")
-                f.write(redacted_text)
-        else:
-            # For now, save as text even if PDF is requested
-            # (avoiding external dependencies)
-            output_path = output_path.replace('.pdf', '.txt')
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(f"REDACTED DOCUMENT\n")
-                f.write(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write(f"Original: {original_filename}\n")
-                f.write("-" * 50 + "\n\n")
-                f.write(redacted_text)
+        header = (
+            "REDACTED DOCUMENT\n"
+            f"Generated: {now.strftime('%Y-%m-%d %H:%M:%S')}\n"
+            f"Original: {original_filename}\n"
+            + "-" * 50 + "\n\n"
+        )
+        
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(header)
+            f.write(redacted_text)
         
         return output_path
     
@@ -222,8 +329,12 @@ class SimpleRedactionEngine:
         os.makedirs(output_dir, exist_ok=True)
         
         # Save audit trail
-        with open(audit_path, 'w', encoding='utf-8') as f:
-            json.dump(audit_trail, f, indent=2, ensure_ascii=False)
+        if orjson is not None:
+            with open(audit_path, 'wb') as f:
+                f.write(orjson.dumps(audit_trail, option=orjson.OPT_INDENT_2))
+        else:
+            with open(audit_path, 'w', encoding='utf-8') as f:
+                json.dump(audit_trail, f, indent=2, ensure_ascii=False)
         
         return audit_path
 
@@ -0,0 +1,56 @@
+import random
+import unittest
+from unittest import mock
+
+import src.simple_pii_detector as simple_pii_detector
+from src.simple_pii_detector import SCAN_CHUNK_SIZE, SimplePIIDetector
+
+
+def _spans(result):
+    return [(d['type'], d['start'], d['end']) for d in result['detections']]
+
+
+class ChunkedScanTest(unittest.TestCase):
+    """Scanning in chunks across the process pool must match a serial scan"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.detector = SimplePIIDetector()
+
+    def detect(self, text, pool_workers):
+        with mock.patch.object(simple_pii_detector, 'MAX_POOL_WORKERS', pool_workers):
+            return _spans(self.detector.detect_pii(text))
+
+    def assert_same_as_serial(self, text):
+        self.assertGreater(len(text), simple_pii_detector.PARALLEL_SCAN_MIN_LENGTH)
+        self.assertEqual(self.detect(text, 2), self.detect(text, 1))
+
+    def test_mixed_text(self):
+        rng = random.Random(1)
+        words = ['John Smith', '123-45-6789', 'a.b@example.com', '(555) 123-4567',
+                 'hello', '12345', 'x' * 70 + '@example.com', '01/02/1990', '4111 1111 1111 1111']
+        text = ' '.join(rng.choice(words) for _ in range(40000))
+        pattern = self.detector._ascii_variants[(True, True)]
+        subject = text.encode('ascii')
+        full = [(m.lastgroup, *m.span()) for m in pattern.finditer(subject)]
+        self.assertEqual(self.detector._scan_parallel(pattern, subject), full)
+
+    def test_matches_straddling_a_chunk_boundary(self):
+        samples = [
+            # Longest email the pattern accepts
+            'x' * 512 + '@' + 'd' * 253 + '.' + 'c' * 63,
+            # Name whose lookahead runs into a long local part
+            'Jane Roe-first.last.' + 'x' * 480 + '@example.com',
+            # Local part too long to be an email, so the name stands
+            'Jane Roe-first.last.' + 'x' * 1100 + '@example.com',
+            'Abcdefghijklmnopqrstuvwxyz Abcdefghijklmnopqrstuvwxyz Abcdefghijklmnopqrstuvwxyz',
+        ]
+        for sample in samples:
+            for back in (1, 10, 50, 200, 500, 900):
+                with self.subTest(sample=sample[:20], back=back):
+                    text = 'a' * (SCAN_CHUNK_SIZE - back) + ' ' + sample + ' b' * 150000
+                    self.assert_same_as_serial(text)
+
+
+if __name__ == '__main__':
+    unittest.main()